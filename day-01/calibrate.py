@@ -1,8 +1,15 @@
 """Advent of Code 2023 Day 1"""
 
 import sys
+import os
+import mmap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from enum import IntEnum
+from itertools import repeat
 from pathlib import Path
 import re
+from typing import Iterable, Iterator, Optional, TextIO, Union
 import click
 
 
@@ -23,64 +30,241 @@ DIGITS = set(WORD_TO_DIGIT.values())
 WORDS = set(WORD_TO_DIGIT.keys())
 
 
-def part_i(txt: str):
+class _Automaton:
+    """Aho-Corasick automaton matching a set of patterns in a single pass over a sequence"""
+
+    def __init__(self, patterns: dict):
+
+        # trie of patterns: transitions, and the value of the pattern ending at each state (if any)
+        self.goto: list[dict] = [{}]
+        self.value: list = [None]
+        for pattern, value in patterns.items():
+            state = 0
+            for elem in pattern:
+                if elem not in self.goto[state]:
+                    self.goto.append({})
+                    self.value.append(None)
+                    self.goto[state][elem] = len(self.goto) - 1
+                state = self.goto[state][elem]
+            self.value[state] = value
+
+        # failure links point to the state for the longest proper suffix that is also in the trie, found
+        #   breadth-first so that shallower states are always complete first
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for elem, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and elem not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(elem, 0)
+                if self.value[child] is None:
+                    self.value[child] = self.value[self.fail[child]]
+
+    def scan(self, seq: Iterable) -> Iterator:
+        """Yield the value of each match, in the order the matches end"""
+        goto, fail, value = self.goto, self.fail, self.value
+        state = 0
+        for elem in seq:
+            while state and elem not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(elem, 0)
+            if value[state] is not None:
+                yield value[state]
+
+
+class DigitScanner:
+    """Finds digits (or any other patterns) in a line in a single pass, including overlapping matches
+
+    For example, "eightwo" contains "eight" then "two". Patterns may not contain one another, so that the order in
+    which matches end is also the order in which they start. Works on str patterns and lines, or bytes patterns and
+    lines.
+    """
+
+    def __init__(self, patterns: dict):
+        if any(a != b and a in b for a in patterns for b in patterns):
+            raise ValueError(f'Patterns may not contain one another: {list(patterns)}')
+        self._forward = _Automaton(patterns)
+        self._backward = _Automaton({k[::-1]: v for k, v in patterns.items()})
+
+    def scan(self, line: Union[str, bytes]) -> Iterator:
+        """Yield the value of each match in the line, first to last"""
+        return self._forward.scan(line)
+
+    def first(self, line: Union[str, bytes]):
+        """Return the value of the first match in the line, or None, scanning forward from the start"""
+        return next(self._forward.scan(line), None)
+
+    def last(self, line: Union[str, bytes]):
+        """Return the value of the last match in the line, or None, scanning backward from the end"""
+        return next(self._backward.scan(reversed(line)), None)
+
+    def first_and_last(self, line: Union[str, bytes]) -> tuple:
+        """Return the values of the first and last match in the line, scanning in from both ends and stopping at the
+        first match from each
+        """
+        return self.first(line), self.last(line)
+
+
+DIGIT_SCANNER = DigitScanner({x: x for x in DIGITS})
+
+WORD_SCANNER = DigitScanner({**WORD_TO_DIGIT, **{x: x for x in DIGITS}})
+
+# same, for raw (undecoded) input, with digits as integer values
+BYTES_SCANNERS = {
+    '1': DigitScanner({x.encode(): int(x) for x in DIGITS}),
+    '2': DigitScanner({x.encode(): int(y) for x, y in {**WORD_TO_DIGIT, **{x: x for x in DIGITS}}.items()}),
+}
+
+
+class Verbosity(IntEnum):
+    QUIET = 0  # no output
+    SUMMARY = 1  # final result only
+    TRACE = 2  # final result, plus a line of detail for each input line
+
+
+class Output:
+    """Writes output at the requested verbosity
+
+    Trace lines are buffered and written in bulk, rather than printed one at a time.
+    """
+
+    def __init__(self, verbosity: Verbosity = Verbosity.SUMMARY, stream: Optional[TextIO] = None, buffer_size: int = 10_000):
+        self.verbosity = verbosity
+        self.stream = stream or sys.stdout
+        self.buffer_size = buffer_size
+        self._buffer: list[str] = []
+
+    @property
+    def tracing(self) -> bool:
+        """True if trace lines are written, check this before building expensive trace messages"""
+        return self.verbosity >= Verbosity.TRACE
+
+    def trace(self, msg: str):
+        if self.tracing:
+            self._buffer.append(msg)
+            if len(self._buffer) >= self.buffer_size:
+                self.flush()
+
+    def summary(self, msg: str):
+        self.flush()
+        if self.verbosity >= Verbosity.SUMMARY:
+            self.stream.write(msg + '\n')
+
+    def flush(self):
+        if self._buffer:
+            self.stream.write('\n'.join(self._buffer) + '\n')
+            self._buffer.clear()
+
+
+def _calibrate(txt: str, scanner: DigitScanner, output: Output) -> int:
+    """Return the sum of calibration values, formed from the first and last digit found on each line"""
 
     total = 0
     for line in txt.splitlines():
         
-        digits = []
-        
-        for idx in range(len(line)):
-            
-            # check for character digits
-            if line[idx] in DIGITS:
-                digits.append(line[idx])
+        first, last = scanner.first_and_last(line)
 
-        this = int(digits[0] + digits[-1])
+        this = int(first + last)
         total += this
-        print(f"{line=}, {digits=}, {this=}, {total=}")
+        if output.tracing:
+            output.trace(f"{line=}, {first=}, {last=}, {this=}, {total=}")
             
-    print(f'{total=}')
+    output.summary(f'{total=}')
+    return total
+
+
+def part_i(txt: str, output: Optional[Output] = None) -> int:
+    return _calibrate(txt, DIGIT_SCANNER, output or Output())
+
+
+def part_ii(txt: str, output: Optional[Output] = None) -> int:
+    return _calibrate(txt, WORD_SCANNER, output or Output())
 
 
-def part_ii(txt: str):
+def _chunk_bounds(data: mmap.mmap, chunk_size: int) -> list[tuple[int, int]]:
+    """Split data into (start, end) byte ranges of about chunk_size bytes, each ending just after a newline"""
+    bounds = [0]
+    while bounds[-1] + chunk_size < len(data):
+        newline = data.find(b'\n', bounds[-1] + chunk_size)
+        if newline < 0:
+            break
+        bounds.append(newline + 1)
+    bounds.append(len(data))
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if start < end]
 
+
+def _calibrate_chunk(input_path: str, part: str, start: int, end: int) -> int:
+    """Return the sum of calibration values for the lines in a byte range of the input file"""
+    scanner = BYTES_SCANNERS[part]
     total = 0
-    for line in txt.splitlines():
-        
-        digits = []
-        
-        for idx in range(len(line)):
-            
-            # check for character digits
-            if line[idx] in DIGITS:
-                digits.append(line[idx])
-
-            # check for word digits
-            else:
-                for word in WORDS:
-                    if line[idx:].startswith(word):
-                        digits.append(WORD_TO_DIGIT[word])
-                        break
-        this = int(digits[0] + digits[-1])
-        total += this
-        print(f"{line=}, {digits=}, {this=}, {total=}")
-            
-    print(f'{total=}')
-            
 
-if __name__ == '__main__':
+    with open(input_path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        while start < end:
+            newline = data.find(b'\n', start, end)
+            stop = end if newline < 0 else newline
+            if line := data[start:stop].rstrip(b'\r'):
+                first, last = scanner.first_and_last(line)
+                total += 10 * first + last
+            start = stop + 1
+
+    return total
+
+
+def calibrate_file(input_path: str, part: str, workers: Optional[int] = None, chunk_size: int = 64 * 2**20) -> int:
+    """Return the sum of calibration values for the input file, computed in parallel worker processes
+
+    The file is memory-mapped and split into newline-aligned byte ranges, which the workers scan as raw bytes without
+    decoding. Gives the same result as part_i (part '1') or part_ii (part '2').
+    """
+    if not os.path.getsize(input_path):
+        return 0
+
+    with open(input_path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        bounds = _chunk_bounds(data, chunk_size)
 
-    _, input_path, part = sys.argv
+    starts, ends = zip(*bounds)
+    with ProcessPoolExecutor(workers) as pool:
+        return sum(pool.map(_calibrate_chunk, repeat(input_path), repeat(part), starts, ends))
+
+
+@click.command()
+@click.argument('input_path', type=click.Path(exists=True, dir_okay=False))
+@click.argument('part', type=click.Choice(['1', '2']))
+@click.option(
+    '--verbosity',
+    type=click.Choice([x.name.lower() for x in Verbosity]),
+    default='summary',
+    help='Print nothing (quiet), the result (summary), or the result and a line per input line (trace)',
+)
+@click.option(
+    '--workers',
+    type=int,
+    default=None,
+    help='Memory-map the input and sum it in this many worker processes (0 for one per CPU)',
+)
+def main(input_path: str, part: str, verbosity: str, workers: Optional[int]):
+
+    output = Output(Verbosity[verbosity.upper()])
+
+    if workers is not None:
+        if output.tracing:
+            raise click.UsageError('Trace output is not available with --workers')
+        total = calibrate_file(input_path, part, workers or None)
+        output.summary(f'{total=}')
+        return
 
     with open(input_path, 'r') as fp:
        input_txt = fp.read()
 
     if part == '1':
-        part_i(input_txt)
+        part_i(input_txt, output)
 
     elif part == '2':
-        part_ii(input_txt)
+        part_ii(input_txt, output)
+            
 
-    else:
-        raise ValueError('Invalid {part=}')
+if __name__ == '__main__':
+    main()
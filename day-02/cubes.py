@@ -1,5 +1,9 @@
+from __future__ import annotations
 import sys
+import re
 import attrs
+import numpy as np
+from typing import Union
 
 
 @attrs.frozen
@@ -55,31 +59,185 @@ class Game:
         return self.red * self.green * self.blue
 
 
-def parse_games(filename: str) -> tuple[Game, ...]:
-    """Return all games defined in the input file"""
+@attrs.frozen(eq=False)
+class GameTable:
+    """Columnar store of games, for answering queries about many games at once
+
+    Holds game IDs with shape (num_games,), and the most cubes of each color seen in any draw of each game with shape
+    (num_games, 3), columns in (red, green, blue) order.
+    """
+
+    ids: np.ndarray
+    maxima: np.ndarray
+
+    @classmethod
+    def from_draws(cls, ids: np.ndarray, draws: np.ndarray, offsets: np.ndarray) -> GameTable:
+        """Create from all draws, shape (num_draws, 3), and the index of the first draw of each game"""
+        if not len(ids):
+            return cls(np.asarray(ids, dtype=np.int64), np.zeros((0, 3), dtype=np.int64))
+        return cls(np.asarray(ids, dtype=np.int64), np.maximum.reduceat(draws, offsets))
+
+    @classmethod
+    def from_games(cls, games: tuple[Game, ...]) -> GameTable:
+        """Create from parsed Game objects, in the same order"""
+        draws = np.array([(x.red, x.green, x.blue) for game in games for x in game.draws], dtype=np.int64)
+        offsets = np.cumsum([0] + [len(game.draws) for game in games[:-1]])
+        return cls.from_draws(np.array([x.game_id for x in games]), draws.reshape(-1, 3), offsets)
+
+    def possible(self, c: Cubes) -> np.ndarray:
+        """Boolean mask of games that would be possible if the number of cubes in the bag is 'c'"""
+        return (self.maxima <= (c.red, c.green, c.blue)).all(axis=1)
+
+    def possible_id_sum(self, c: Cubes) -> int:
+        """Sum of the IDs of games that would be possible if the number of cubes in the bag is 'c'"""
+        return int(self.ids[self.possible(c)].sum())
+
+    @property
+    def power(self) -> np.ndarray:
+        """Power of each game"""
+        return self.maxima.prod(axis=1)
+
+
+@attrs.frozen(eq=False)
+class FeasibilityIndex:
+    """Index of games for answering "sum of IDs of games possible with bag (r, g, b)" for many bags
+
+    Each color's per-game maxima are compressed to their distinct values, and game IDs are accumulated into a dense
+    3D prefix-sum table over them: table[i, j, k] is the sum of IDs of games needing no more than the i-th smallest
+    red count, j-th green and k-th blue (index 0 meaning less than any). A query is a binary search per color plus one
+    lookup, independent of the number of games. The table has one entry per combination of distinct counts, which
+    stays small for cube counts.
+    """
+
+    counts: tuple[np.ndarray, np.ndarray, np.ndarray]
+    table: np.ndarray
+
+    @classmethod
+    def from_table(cls, games: GameTable) -> FeasibilityIndex:
+        counts = tuple(np.unique(games.maxima[:, ii]) for ii in range(3))
+        coords = tuple(np.searchsorted(counts[ii], games.maxima[:, ii]) + 1 for ii in range(3))
+
+        table = np.zeros(tuple(len(x) + 1 for x in counts), dtype=np.int64)
+        np.add.at(table, coords, games.ids)
+        table = table.cumsum(axis=0).cumsum(axis=1).cumsum(axis=2)
+
+        return cls(counts, table)
+
+    def possible_id_sums(self, bags: np.ndarray) -> np.ndarray:
+        """Sum of the IDs of possible games for each bag, given as rows of (red, green, blue) counts"""
+        bags = np.asarray(bags).reshape(-1, 3)
+        idx = tuple(np.searchsorted(self.counts[ii], bags[:, ii], side='right') for ii in range(3))
+        return self.table[idx]
+
+    def possible_id_sum(self, c: Cubes) -> int:
+        """Sum of the IDs of games that would be possible if the number of cubes in the bag is 'c'"""
+        return int(self.possible_id_sums([(c.red, c.green, c.blue)])[0])
+
+
+def parse_games(
+    filename: str, columnar: bool = False, strict: bool = False, fast: bool = True
+) -> Union[tuple[Game, ...], GameTable]:
+    """Return all games defined in the input file, optionally as a columnar GameTable
+
+    By default the columnar table is parsed directly (see parse_game_table), and only validates the input if 'strict'
+    is set. Otherwise, if 'fast' is not set, it is built from Game objects, which are always checked.
+    """
+    if columnar and fast:
+        return parse_game_table(filename, strict)
+
     with open(filename, 'r') as fp:
         games = []
         for line in fp.read().splitlines():
             games.append(Game.from_string(line))
-    return tuple(games)
+    games = tuple(games)
+
+    return GameTable.from_games(games) if columnar else games
+
+
+# column for each color in a GameTable
+COLUMNS = {b'red': 0, b'green': 1, b'blue': 2}
+
+# tokens in the input file: a game header, a number of cubes of some color, or the end of a draw
+TOKENS = re.compile(rb'Game\s+(\d+)\s*:|(\d+) (\w+)|[;\n]')
+
+
+def parse_game_table(filename: str, strict: bool = False) -> GameTable:
+    """Parse the input file straight to a GameTable, in a single regex pass over the raw bytes
+
+    Only the per-game maxima are kept, no Game or Cubes objects are built. Optionally, also validate the input as fully
+    as Game.from_string does: tokens must follow each other in order, separated only by commas between the cubes of a
+    draw and whitespace, and no color may appear more than once in a draw.
+    """
+    with open(filename, 'rb') as fp:
+        data = fp.read()
+
+    ids = []
+    maxima = []
+    seen = set()
+
+    # kind of the previous token ('game', 'cubes' or the end of draw character) and where it ended, for strict checks
+    prev = None
+    end = 0
+
+    for match in TOKENS.finditer(data):
+        game_id, num, color = match.groups()
+        kind = 'game' if game_id else 'cubes' if num else match[0]
+
+        if strict:
+            gap = data[end:match.start()].strip()
+            if kind == 'game':
+                ok = prev in (None, b'\n') and not gap
+            elif kind == 'cubes':
+                ok = prev in ('game', 'cubes', b';') and gap == (b',' if prev == 'cubes' else b'')
+            else:
+                ok = prev == 'cubes' and not gap
+            if not ok:
+                line = data.count(b'\n', 0, match.start()) + 1
+                raise ValueError(f'Unexpected {match[0].decode()!r} after {gap.decode()!r} on line {line}')
+            prev, end = kind, match.end()
+
+        if game_id:
+            # start of a new game
+            ids.append(int(game_id))
+            maxima.append([0, 0, 0])
+            seen.clear()
+
+        elif num:
+            if not ids:
+                raise ValueError(f'Cubes {match[0].decode()!r} appear before any game header')
+            try:
+                column = COLUMNS[color]
+            except KeyError:
+                raise ValueError(f'Unknown color: {color.decode()}')
+            if strict:
+                if column in seen:
+                    raise ValueError(f'color={color.decode()!r} appears more than once in a draw of game {ids[-1]}')
+                seen.add(column)
+            maxima[-1][column] = max(maxima[-1][column], int(num))
+
+        else:
+            # end of a draw
+            seen.clear()
+
+    if strict and (data[end:].strip() or prev not in (None, 'cubes', b'\n')):
+        raise ValueError(f'Unexpected end of input after {data[end:].decode()!r}')
+
+    return GameTable(np.array(ids, dtype=np.int64), np.array(maxima, dtype=np.int64).reshape(-1, 3))
 
 
 BAG = Cubes(red=12, green=13, blue=14)
 
 
 def part_i(filename: str) -> int:
-    total = 0
-    for game in parse_games(input_path):
-        if game.possible(BAG):
-            total += game.game_id
+    total = parse_games(filename, columnar=True).possible_id_sum(BAG)
     print(f'{total=}')
+    return total
 
 
 def part_ii(filename: str) -> int:
-    total = 0
-    for game in parse_games(input_path):
-        total += game.power
+    total = int(parse_games(filename, columnar=True).power.sum())
     print(f'{total=}')
+    return total
 
 
 
@@ -1,144 +1,262 @@
 """Advent of Code 2023 - Day 3"""
 
+from __future__ import annotations
 import sys
+import re
 from attrs import frozen
+from itertools import chain
 from pprint import pprint
 from math import prod
+from typing import Callable, Iterator
+
+import numpy as np
 
 
 DIGITS = '0123456789'
 NULL = '.'
+NUMBER = re.compile(r'\d+')
 
+# longest number that always fits in an int64
+MAX_INT64_DIGITS = len(str(np.iinfo(np.int64).max)) - 1
 
-@frozen
-class Loc:
-    row: int
-    col: int
 
+def load_grid(filename: str) -> np.ndarray:
+    """Load schematic as a 2D array of character codes"""
+    with open(filename, 'rb') as fp:
+        rows = fp.read().strip().splitlines()
+    if len({len(x) for x in rows}) > 1:
+        raise ValueError('Schematic rows must all be the same length')
+    return np.frombuffer(b''.join(rows), dtype=np.uint8).reshape(len(rows), -1)
 
-def part_i(filename: str):
 
-    with open(filename, 'r') as fp:
-        txt = fp.read().strip()
-        
-    # find locations adjacent to symbols
-    include: set[Loc] = set()
-    for ii, row in enumerate(txt.splitlines()):
-        for jj, elem in enumerate(row):
-            if elem not in NULL + DIGITS:
-                # a symbol! store this location and all neighbors. It does not matter if the
-                #   neighbor locations are in-bounds or not
-                for delta_i in [-1, 0, 1]:
-                    for delta_j in [-1, 0, 1]:
-                        include.add(Loc(ii + delta_i, jj + delta_j))
-            else:
-                # not a symbol, do nothing
-                pass
-    
-    nrows = ii + 1
-    ncols = jj + 1
-        
-    # find part numbers and sum if they are to be included
-    total = 0
-    for ii, row in enumerate(txt.splitlines()):
-
-        nums = []
-        locs = set()
-
-        for jj, elem in enumerate(row):
-            if elem in DIGITS:
-                # a digit in a number! append it
-                nums.append(elem)
-                locs.add(Loc(ii, jj))
-                
-            if nums and (elem not in DIGITS or jj == ncols - 1):
-                # we have a part number in progress and have either reached its end or reached the end of the row!
-                # complete the part number, and sum if it should be included
-                value = int(''.join(nums)) 
-                if include.intersection(locs):
-                    total += value
-                else:
-                    pass
-
-                # reset for next part number
-                nums = []
-                locs = set()
-                
-               
+def digit_mask(grid: np.ndarray) -> np.ndarray:
+    """True where the grid contains a digit"""
+    return (grid >= ord('0')) & (grid <= ord('9'))
+
+
+def symbol_mask(grid: np.ndarray) -> np.ndarray:
+    """True where the grid contains a symbol"""
+    return ~digit_mask(grid) & (grid != ord(NULL))
+
+
+def dilate(mask: np.ndarray) -> np.ndarray:
+    """Grow a boolean mask to include all neighbors (including diagonals) of each True element"""
+    nrows, ncols = mask.shape
+    padded = np.pad(mask, 1)
+    grown = np.zeros_like(mask)
+    for delta_i in range(3):
+        for delta_j in range(3):
+            grown |= padded[delta_i:delta_i + nrows, delta_j:delta_j + ncols]
+    return grown
+
+
+@frozen(eq=False)
+class Numbers:
+    """Numbers in a schematic, as runs of digits within rows
+
+    Positions are flat indices into the grid with a padding column appended to each row, so that runs never
+    continue from one row into the next. 'positions' holds the index of every digit, grouped by number, and
+    'offsets' the index into 'positions' of the first digit of each number.
+    """
+    values: np.ndarray
+    positions: np.ndarray
+    offsets: np.ndarray
+
+    def reduce_any(self, mask: np.ndarray) -> np.ndarray:
+        """True for each number that has any digit where the (grid-shaped) mask is True"""
+        if not len(self.values):
+            return np.zeros(0, dtype=bool)
+        padded = np.pad(mask, ((0, 0), (0, 1))).ravel()
+        return np.logical_or.reduceat(padded[self.positions], self.offsets)
+
+    def labels(self, shape: tuple[int, int]) -> np.ndarray:
+        """Grid (of the given shape) of the index of the number occupying each cell, or -1 if none"""
+        nrows, ncols = shape
+        labels = np.full(nrows * (ncols + 1), -1, dtype=np.int64)
+        lengths = np.diff(self.offsets, append=len(self.positions))
+        labels[self.positions] = np.repeat(np.arange(len(self.values)), lengths)
+        return labels.reshape(nrows, ncols + 1)[:, :ncols]
+
+
+def find_numbers(grid: np.ndarray) -> Numbers:
+    """Find all numbers in the grid"""
+
+    # pad each row with a non-digit so runs end at the end of the row
+    is_digit = np.pad(digit_mask(grid), ((0, 0), (0, 1))).ravel()
+    padded = np.pad(grid, ((0, 0), (0, 1))).ravel()
+    digits = padded.astype(np.int64) - ord('0')
+
+    # runs of digits start where the mask switches on and stop where it switches off
+    edges = np.diff(is_digit.astype(np.int8), prepend=0)
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    lengths = stops - starts
+
+    positions = np.flatnonzero(is_digit)
+    offsets = np.cumsum(lengths) - lengths
+    if not len(positions):
+        return Numbers(np.zeros(0, dtype=np.int64), positions, offsets)
+
+    # value of each digit, given its place within its number
+    places = np.repeat(stops - 1, lengths) - positions
+    values = np.add.reduceat(digits[positions] * 10 ** places, offsets)
+
+    # numbers too long for int64 overflow above, rebuild them as Python integers instead
+    if (lengths > MAX_INT64_DIGITS).any():
+        values = values.astype(object)
+        for ii in np.flatnonzero(lengths > MAX_INT64_DIGITS):
+            values[ii] = int(padded[starts[ii]:stops[ii]].tobytes())
+
+    return Numbers(values, positions, offsets)
+
+
+def part_i(filename: str, strategy: str = 'grid'):
+
+    if strategy == 'grid':
+        grid = load_grid(filename)
+
+        # part numbers are those with a digit next to (or on) a symbol
+        numbers = find_numbers(grid)
+        include = numbers.reduce_any(dilate(symbol_mask(grid)))
+
+        total = int(numbers.values[include].sum())
+
+    elif strategy == 'stream':
+        total, _ = stream_totals(filename)
+
+    else:
+        raise ValueError(f'Unknown strategy: {strategy}')
+
     print(f'{total=}')
 
 
-def part_ii(filename):
+def adjacent_numbers(grid: np.ndarray, symbol: str = '*') -> list[tuple[int, ...]]:
+    """Return the values of the distinct numbers next to each instance of the symbol, in row-major order
+
+    Looks up the 8 neighbors of each symbol in a grid labeled with the number occupying each cell, so the cost is
+    linear in the size of the grid rather than in symbols x numbers.
+    """
+    numbers = find_numbers(grid)
+    labels = np.pad(numbers.labels(grid.shape), 1, constant_values=-1)
+
+    rows, cols = np.nonzero(grid == ord(symbol))
+    neighbors = np.stack(
+        [labels[rows + delta_i, cols + delta_j] for delta_i in range(3) for delta_j in range(3)],
+        axis=1,
+    )
+
+    # a number may neighbor a symbol at several of its digits, count it once
+    neighbors.sort(axis=1)
+    distinct = neighbors >= 0
+    distinct[:, 1:] &= neighbors[:, 1:] != neighbors[:, :-1]
+
+    return [tuple(numbers.values[row[keep]].tolist()) for row, keep in zip(neighbors, distinct)]
+
+
+def is_gear(adjacent: tuple[int, ...]) -> bool:
+    """A gear is a symbol next to exactly two numbers"""
+    return len(adjacent) == 2
+
+
+def gear_total(grid: np.ndarray, symbol: str = '*', predicate: Callable[[tuple[int, ...]], bool] = is_gear) -> int:
+    """Return the sum of the products of the numbers adjacent to each symbol for which predicate is True"""
+    return sum(prod(x) for x in adjacent_numbers(grid, symbol) if predicate(x))
+
+
+@frozen(eq=False)
+class Row:
+    """A row of a schematic, with the numbers in it
+
+    Numbers are (value, start column, end column) with the end excluded, and 'labels' gives the index of the number
+    occupying each column, or -1.
+    """
+    text: str
+    numbers: list[tuple[int, int, int]]
+    labels: list[int]
+
+    @classmethod
+    def from_string(cls, text: str) -> Row:
+        numbers = []
+        labels = [-1] * len(text)
+        for match in NUMBER.finditer(text):
+            labels[match.start():match.end()] = [len(numbers)] * len(match.group())
+            numbers.append((int(match.group()), match.start(), match.end()))
+        return cls(text, numbers, labels)
+
+
+def stream_schematic(
+    filename: str, symbol: str = '*', predicate: Callable[[tuple[int, ...]], bool] = is_gear
+) -> Iterator[tuple[str, int]]:
+    """Yield ('part', part number) and ('gear', gear product) events, reading the schematic one row at a time
+
+    Only a window of three rows is held in memory, so memory use is proportional to the width of the schematic
+    rather than its area. Events for a row are yielded as soon as the row below it has been read.
+    """
+
+    def is_symbol(char: str) -> bool:
+        return char not in NULL + DIGITS
 
     with open(filename, 'r') as fp:
-        txt = fp.read().strip()
-    
-    # find symbol locations
-    gear_candidates: set[Loc] = set()
-    for ii, row in enumerate(txt.splitlines()):
-        for jj, elem in enumerate(row):
-            if elem == '*':
-                # a possible gear! store this location
-                gear_candidates.add(Loc(ii, jj))
-            else:
-                # not a gear, do nothing
-                pass
-    
-    nrows = ii + 1
-    ncols = jj + 1
-        
-    # find part numbers and locations adjacent to them
-    numbers: list[tuple[int, set[Loc]]] = []
-    for ii, row in enumerate(txt.splitlines()):
-
-        num_chars = []
-        num_locs = set()
-
-        for jj, elem in enumerate(row):
-
-            if elem in DIGITS:
-                # a digit in a number! append it and store this location and all neighbors.
-                # It does not matter if the neighbor locations are in-bounds or not
-                num_chars.append(elem)
-                for delta_i in [-1, 0, 1]:
-                    for delta_j in [-1, 0, 1]:
-                        num_locs.add(Loc(ii + delta_i, jj + delta_j))
-                
-            if num_chars and (elem not in DIGITS or jj == ncols - 1):
-                # we have a part number in progress and have either reached its end or reached the end of the row!
-                num = int(''.join(num_chars)) 
-                numbers.append((num, num_locs))
-
-                # reset for next part number
-                num_chars = []
-                num_locs = set()
-                
-    # identify gears and sum their values
-    total = 0
-    for candidate in gear_candidates:
-        adjacent_numbers = []
-        for num, locs in numbers:
-            if candidate in locs:
-                adjacent_numbers.append(num)
-        if len(adjacent_numbers) == 2:
-            # print(f'{candidate=}, {adjacent_numbers=}')
-            total += prod(adjacent_numbers)
+        texts = (x for x in (line.rstrip('\n') for line in fp) if x)
+
+        above = middle = None
+        for text in chain(texts, [None]):
+            below = None if text is None else Row.from_string(text)
+
+            if middle is not None:
+                window = [x for x in (above, middle, below) if x is not None]
+
+                # part numbers in the middle row are those next to a symbol in any row of the window
+                for value, start, end in middle.numbers:
+                    cols = slice(max(start - 1, 0), end + 1)
+                    if any(is_symbol(char) for row in window for char in row.text[cols]):
+                        yield 'part', value
+
+                # gears in the middle row, by the distinct numbers next to them in any row of the window
+                for col, char in enumerate(middle.text):
+                    if char == symbol:
+                        adjacent = tuple(
+                            row.numbers[label][0]
+                            for row in window
+                            for label in dict.fromkeys(row.labels[max(col - 1, 0):col + 2])
+                            if label >= 0
+                        )
+                        if predicate(adjacent):
+                            yield 'gear', prod(adjacent)
+
+            above, middle = middle, below
+
+
+def stream_totals(filename: str, symbol: str = '*', predicate: Callable[[tuple[int, ...]], bool] = is_gear) -> tuple[int, int]:
+    """Return the part number total and gear total, summing the events of stream_schematic
+
+    Gives the same totals as part_i and part_ii.
+    """
+    totals = {'part': 0, 'gear': 0}
+    for kind, value in stream_schematic(filename, symbol, predicate):
+        totals[kind] += value
+    return totals['part'], totals['gear']
+
+
+def part_ii(filename: str, strategy: str = 'grid'):
+
+    if strategy == 'grid':
+        total = gear_total(load_grid(filename))
+    elif strategy == 'stream':
+        _, total = stream_totals(filename)
+    else:
+        raise ValueError(f'Unknown strategy: {strategy}')
 
     print(f'{total=}')
 
 
 if __name__ == '__main__':
 
-    _, input_path, part = sys.argv
+    _, input_path, part, *options = sys.argv
     
     if part == '1':
-       part_i(input_path)
+       part_i(input_path, *options)
     elif part == '2':
-       part_ii(input_path)
-        pass
+       part_ii(input_path, *options)
     else:
         raise ValueError(f'No such {part=}')
-
-
-
-               
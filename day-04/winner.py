@@ -1,5 +1,19 @@
 import sys
 import attrs
+import numpy as np
+from typing import Iterable
+
+
+# longest number that always fits in an int64
+MAX_INT64_DIGITS = len(str(np.iinfo(np.int64).max)) - 1
+
+
+def to_bitmask(values: Iterable[int]) -> int:
+    """Encode a set of non-negative integers as an integer with the corresponding bits set"""
+    mask = 0
+    for value in values:
+        mask |= 1 << value
+    return mask
 
 
 @attrs.define
@@ -10,6 +24,13 @@ class Card:
     have: tuple[int]
     copies: int = 1
 
+    # number of winning numbers we have, counted once as the set bits in common between the bitmasks of both sets of
+    #   numbers (which are distinct on each card)
+    matches: int = attrs.field(init=False)
+
+    def __attrs_post_init__(self):
+        self.matches = (to_bitmask(self.win) & to_bitmask(self.have)).bit_count()
+
     @classmethod
     def parse(cls, card_txt) -> 'Card':
         id_txt, card_txt = card_txt.strip().split(':')
@@ -21,24 +42,79 @@ class Card:
         )
 
     def num_matches(self) -> int:
-        return sum(1 if num in self.win else 0 for num in self.have)
+        return self.matches
 
     def score(self) -> int:
-        power = self.num_matches() - 1
-        if power: 
-            return 2**power
+        if matches := self.num_matches():
+            return 2**(matches - 1)
         return 0
 
 
+def load_deck(filename: str) -> tuple[np.ndarray, np.ndarray]:
+    """Parse all cards in the input file at once, returning matrices of winning numbers and numbers we have, with one
+    row per card. All cards must have the same count of each kind of number.
+
+    Works directly on the bytes of the file as an array, without creating an object per card or number.
+    """
+    with open(filename, 'rb') as fp:
+        data = np.frombuffer(fp.read().strip(), dtype=np.uint8)
+
+    # line of each byte, and its section within the line: card ID (0), winning numbers (1) or numbers we have (2)
+    newline = data == ord('\n')
+    line = np.cumsum(newline) - newline
+    line_starts = np.concatenate(([0], np.flatnonzero(newline) + 1))
+    is_separator = (data == ord(':')) | (data == ord('|'))
+    separators_before = np.cumsum(is_separator) - is_separator
+    section = separators_before - separators_before[line_starts][line]
+
+    # numbers are runs of digits
+    is_digit = (data >= ord('0')) & (data <= ord('9'))
+    starts = np.flatnonzero(is_digit & ~np.concatenate(([False], is_digit[:-1])))
+    ends = np.flatnonzero(is_digit & ~np.concatenate((is_digit[1:], [False])))
+
+    # every line must have one of each separator, and the same count of numbers in each section as the first line
+    num_lines = len(line_starts)
+    separators = np.bincount(line[is_separator] * 2 + (data[is_separator] == ord('|')), minlength=2 * num_lines)
+    counts = np.bincount(line[starts] * 3 + np.minimum(section[starts], 2), minlength=3 * num_lines).reshape(-1, 3)
+    bad = (separators.reshape(-1, 2) != 1).any(axis=1) | (counts != counts[0]).any(axis=1) | (counts[:, 0] != 1)
+    if bad.any():
+        raise ValueError(f'Card on line {np.argmax(bad) + 1} does not have the same layout as the first card')
+
+    # numbers are combined from their digits in int64, so they must be short enough not to overflow
+    lengths = ends - starts + 1
+    if len(lengths) and lengths.max() > MAX_INT64_DIGITS:
+        raise ValueError(f'Numbers may have at most {MAX_INT64_DIGITS} digits, found {lengths.max()}')
+
+    positions = np.flatnonzero(is_digit)
+    places = np.repeat(ends, lengths) - positions
+    digits = (data[positions] - ord('0')).astype(np.int64)
+    values = np.add.reduceat(digits * 10**places, np.cumsum(lengths) - lengths) if len(positions) else digits
+
+    # each row is the card ID, then the winning numbers, then the numbers we have
+    num_win = counts[0, 1]
+    values = values.reshape(num_lines, -1)
+
+    return values[:, 1:1 + num_win], values[:, 1 + num_win:]
+
+
+def match_counts(win: np.ndarray, have: np.ndarray) -> np.ndarray:
+    """Return the number of winning numbers we have on each card, given matrices as from load_deck
+
+    Winning numbers are marked in a boolean table with one row per card and one column per possible number, which
+    the numbers we have then index into.
+    """
+    rows = np.arange(len(win))[:, None]
+    is_winner = np.zeros((len(win), max(win.max(initial=0), have.max(initial=0)) + 1), dtype=bool)
+    is_winner[rows, win] = True
+    return is_winner[rows, have].sum(axis=1)
+
+
 def part_i(filename: str):
 
-    with open(filename, 'r') as fp:
-        lines = fp.readlines()
-    
-    total_value = 0
-    for line in lines: 
-        card = Card.parse(line)
-        total_value += card.score()
+    matches = match_counts(*load_deck(filename))
+
+    # score doubles with each match after the first, and is zero with no matches
+    total_value = int(((1 << matches) >> 1).sum())
 
     print(f'{total_value=}')
 
@@ -50,14 +126,19 @@ def part_ii(filename: str):
         for line in fp.readlines():
             cards.append(Card.parse(line))
 
-    # resolve cards and their copies
+    # resolve cards and their copies. Each card adds its copies to a run of following cards, which is recorded in a
+    #   difference array as an increment at the start of the run and a decrement just past its end
+    delta = [0] * (len(cards) + 1)
+    added = 0
     total_cards = 0
     for ii, card in enumerate(cards):
 
+        added += delta[ii]
+        card.copies += added
         total_cards += card.copies
 
-        for jj in range(ii + 1, ii + 1 + card.num_matches()):
-            cards[jj].copies += card.copies 
+        delta[ii + 1] += card.copies
+        delta[min(ii + 1 + card.num_matches(), len(cards))] -= card.copies
 
     print(f'{total_cards=}')
 
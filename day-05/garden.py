@@ -1,9 +1,17 @@
 from __future__ import annotations
 import sys
 
-import re
+import gzip
 import attrs
-from typing import Optional, Union
+import numpy as np
+from bisect import bisect_left, bisect_right
+from functools import cache, reduce
+from typing import Iterable, Iterator, Optional, TextIO, Union
+
+
+# bounds for all values, so that every value falls in some segment of a Transformer
+MIN_VALUE = int(np.iinfo(np.int64).min)
+MAX_VALUE = int(np.iinfo(np.int64).max)
 
 
 @attrs.frozen(order=True)
@@ -38,7 +46,7 @@ class Range:
         return tuple(parts)
 
 
-@attrs.frozen
+@attrs.frozen(cache_hash=True)
 class Transformer:
     """Piecewise transform defined by a set of "rules"
 
@@ -49,13 +57,83 @@ class Transformer:
 
     rules: tuple[tuple[Range, int], ...]
 
+    # rules precompiled to sorted, non-overlapping segments: the segment starting at breakpoints[i] extends up to the
+    #   next breakpoint, and values in it are transformed by adding offsets[i]
+    breakpoints: tuple[int, ...] = attrs.field(init=False, repr=False, eq=False)
+    offsets: tuple[int, ...] = attrs.field(init=False, repr=False, eq=False)
+
+    # same, as arrays for vectorized lookups
+    _breakpoints_array: np.ndarray = attrs.field(init=False, repr=False, eq=False)
+    _offsets_array: np.ndarray = attrs.field(init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self):
+        
+        bounds = sorted({MIN_VALUE}.union(*((rng.start, rng.end + 1) for rng, _ in self.rules)))
+        offsets = [0] * len(bounds)
+
+        # apply rules in reverse order, so the first rule wins where rules overlap (as in a linear scan)
+        for rng, offset in reversed(self.rules):
+            lo = bisect_left(bounds, rng.start)
+            hi = bisect_left(bounds, rng.end + 1)
+            offsets[lo:hi] = [offset] * (hi - lo)
+
+        # merge neighboring segments that have the same offset
+        breakpoints = []
+        merged_offsets = []
+        for bound, offset in zip(bounds, offsets):
+            if not merged_offsets or merged_offsets[-1] != offset:
+                breakpoints.append(bound)
+                merged_offsets.append(offset)
+
+        object.__setattr__(self, 'breakpoints', tuple(breakpoints))
+        object.__setattr__(self, 'offsets', tuple(merged_offsets))
+        object.__setattr__(self, '_breakpoints_array', np.array(breakpoints, dtype=np.int64))
+        object.__setattr__(self, '_offsets_array', np.array(merged_offsets, dtype=np.int64))
+
     def scalar(self, value: int) -> int:
         """Transform scalar integer
         """
-        for rng, offset in self.rules:
-            if rng.contains(value):
-                return value + offset
-        return value
+        return value + self.offsets[bisect_right(self.breakpoints, value) - 1]
+
+    def transform_many(self, values: np.ndarray) -> np.ndarray:
+        """Transform an array of integers
+        """
+        idx = np.searchsorted(self._breakpoints_array, values, side='right') - 1
+        return values + self._offsets_array[idx]
+
+    def segments(self) -> Iterator[tuple[Range, int]]:
+        """Yield the precompiled segments as (range, offset) pairs, covering all values in order"""
+        ends = self.breakpoints[1:] + (MAX_VALUE + 1,)
+        for start, end, offset in zip(self.breakpoints, ends, self.offsets):
+            yield Range(start, end - 1), offset
+
+    def compose(self, other: Transformer) -> Transformer:
+        """Return a single transformer equivalent to applying self, then other"""
+        rules = []
+
+        for rng, offset in self.segments():
+
+            # split this segment where other's offset changes within its (shifted) image
+            lo = bisect_right(other.breakpoints, rng.start + offset) - 1
+            hi = bisect_right(other.breakpoints, rng.end + offset)
+
+            for ii in range(lo, hi):
+                start = max(rng.start, other.breakpoints[ii] - offset)
+                end = rng.end if ii + 1 == len(other.breakpoints) else min(rng.end, other.breakpoints[ii + 1] - 1 - offset)
+                if total_offset := offset + other.offsets[ii]:
+                    rules.append((Range(start, end), total_offset))
+
+        return self.__class__(tuple(rules))
+
+    def inverse_segments(self) -> list[tuple[Range, int]]:
+        """Return (output range, offset) for each segment, sorted by output range
+
+        The inputs that a segment maps to its output range are the output range minus the offset.
+        """
+        return sorted(
+            ((Range(rng.start + offset, rng.end + offset), offset) for rng, offset in self.segments()),
+            key=lambda x: x[0].start,
+        )
     
     def range(self, value: Range) -> tuple[Range, ...]:
         """Transform range
@@ -64,134 +142,255 @@ class Transformer:
         to only some parts of the input range, and transforming these parts "splits"
         the original range into multiple output ranges.
         """
-        ranges = [value]
-        complete = []
-        
-        for rule_range, rule_offset in self.rules:
-            
-            # create a place to store range(s) that were not transformed by this rule, to be checked
-            #   against the next one
-            next_ranges = []
-
-            for this_range in ranges:
-                
-                if intersection := this_range.intersection(rule_range):
-                    # the rule applies to at least part of the range
-
-                    # transform the overlap, then these values are completed (at
-                    #  most one rule applies to each value)
-                    complete.append(
-                        Range(
-                            start=intersection.start + rule_offset,
-                            end=intersection.end + rule_offset,
-                        )
-                    )
-
-                    # set the non-overlapping portion(s) of the range aside to check against the 
-                    #   rest of the rules 
-                    next_ranges.extend(
-                        this_range.difference(rule_range)
-                    )
-                
-                else:
-                    # rule does not apply to this input range, set it aside to check against the
-                    #   rest of the rules
-                    next_ranges.append(this_range)
-
-            # try the next rule on all range(s) that have not yet matched a rule
-            ranges = next_ranges
-
-        # combine results, anything not transformed by any rule is returned unchanged
-        return sorted(complete + next_ranges)
-
-
-def _parse_chunks(filename: str) -> list[str]:
-    """Break up input text file into 'chunks' that define seeds and transformers"""
-    with open(filename, 'r') as fp:
-        chunks = re.findall(r'[\w-].*:([ \d\n]*)', fp.read())
-    return [x.strip() for x in chunks]
-
-
-def _parse_seeds(txt: str) -> list[int]:
-    """Parse seeds text chunk as a list of scalar seeds"""
-    return [int(x) for x in txt.split()]
+        return self.transform(RangeSet.from_ranges((value,))).ranges
+
+    def transform(self, values: RangeSet) -> RangeSet:
+        """Transform a set of ranges
+
+        Splits the input ranges at each segment breakpoint they span, then offsets and coalesces the pieces, all as
+        array operations.
+        """
+        if not len(values):
+            return values
+
+        bounds = self._breakpoints_array
+
+        # breakpoints that fall inside an input range (but not at its start) begin a new piece
+        ii = np.minimum(np.searchsorted(values.ends, bounds, side='left'), len(values) - 1)
+        inside = (values.ends[ii] >= bounds) & (values.starts[ii] < bounds)
+        starts = np.sort(np.concatenate((values.starts, bounds[inside])))
+
+        # each piece ends at the end of its input range or segment, whichever comes first
+        range_idx = np.searchsorted(values.starts, starts, side='right') - 1
+        segment_idx = np.searchsorted(bounds, starts, side='right') - 1
+        segment_ends = np.append(bounds[1:] - 1, MAX_VALUE)
+        ends = np.minimum(values.ends[range_idx], segment_ends[segment_idx])
+
+        offsets = self._offsets_array[segment_idx]
+        return RangeSet.from_arrays(starts + offsets, ends + offsets)
+
+
+@attrs.frozen(eq=False)
+class RangeSet:
+    """Set of integers, stored as sorted ranges that do not overlap or touch
+
+    Ranges are stored as a pair of int64 arrays of start and end values (including endpoints) rather than as Range
+    objects, which keeps large sets compact and lets operations on them vectorize. The 'ranges' property gives the
+    Range objects view.
+    """
+
+    starts: np.ndarray
+    ends: np.ndarray
+
+    @classmethod
+    def from_arrays(cls, starts: np.ndarray, ends: np.ndarray) -> RangeSet:
+        """Create from arbitrary ranges, sorting them and merging any that overlap or touch"""
+        order = np.argsort(starts, kind='stable')
+        starts = np.asarray(starts, dtype=np.int64)[order]
+        ends = np.asarray(ends, dtype=np.int64)[order]
+
+        if not len(starts):
+            return cls(starts, ends)
+
+        # a range begins a new group unless it overlaps or touches the furthest end seen so far
+        reach = np.maximum.accumulate(ends)
+        first = np.ones(len(starts), dtype=bool)
+        first[1:] = starts[1:] - 1 > reach[:-1]
+        idx = np.flatnonzero(first)
+
+        return cls(starts[idx], np.maximum.reduceat(ends, idx))
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[Range]) -> RangeSet:
+        """Create from arbitrary Range objects, sorting them and merging any that overlap or touch"""
+        ranges = list(ranges)
+        return cls.from_arrays(
+            np.fromiter((x.start for x in ranges), dtype=np.int64, count=len(ranges)),
+            np.fromiter((x.end for x in ranges), dtype=np.int64, count=len(ranges)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def ranges(self) -> tuple[Range, ...]:
+        """Ranges in the set, as Range objects"""
+        return tuple(Range(start, end) for start, end in zip(self.starts.tolist(), self.ends.tolist()))
+
+    def min(self) -> int:
+        """Return the smallest value in the set"""
+        return int(self.starts[0])
+
+    def first_in(self, value: Range) -> Optional[int]:
+        """Return the smallest value in the set that is also in the input range, if any"""
+        ii = np.searchsorted(self.ends, value.start, side='left')
+        if ii < len(self) and (first := max(int(self.starts[ii]), value.start)) <= value.end:
+            return first
+        return None
+
+    def shift(self, offset: int) -> RangeSet:
+        """Return the set with offset added to all values"""
+        return self.__class__(self.starts + offset, self.ends + offset)
+
+    def intersection(self, other: RangeSet) -> RangeSet:
+        """Return the values in both self and other"""
+
+        # find the span of other's ranges that overlaps each of self's ranges
+        lo = np.searchsorted(other.ends, self.starts, side='left')
+        hi = np.searchsorted(other.starts, self.ends, side='right')
+        counts = np.maximum(hi - lo, 0)
+
+        # expand to one (mine, theirs) pair per overlap
+        mine = np.repeat(np.arange(len(self)), counts)
+        theirs = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - lo, counts)
+
+        # overlaps are sorted and cannot touch, since self's and other's ranges do not
+        return self.__class__(
+            np.maximum(self.starts[mine], other.starts[theirs]),
+            np.minimum(self.ends[mine], other.ends[theirs]),
+        )
+
+    def difference(self, other: RangeSet) -> RangeSet:
+        """Return the values in self that are not in other"""
+        # gaps between the ranges of other, then before the first and after the last unless they are at the limits of
+        #   int64 (where the arithmetic would wrap around)
+        gap_starts = [other.ends[:-1] + 1]
+        gap_ends = [other.starts[1:] - 1]
+        if not len(other) or other.starts[0] != MIN_VALUE:
+            gap_starts.insert(0, [MIN_VALUE])
+            gap_ends.insert(0, other.starts[:1] - 1 if len(other) else [MAX_VALUE])
+        if len(other) and other.ends[-1] != MAX_VALUE:
+            gap_starts.append(other.ends[-1:] + 1)
+            gap_ends.append([MAX_VALUE])
+        gap_starts = np.concatenate(gap_starts).astype(np.int64)
+        gap_ends = np.concatenate(gap_ends).astype(np.int64)
+        keep = gap_starts <= gap_ends
+        return self.intersection(self.__class__(gap_starts[keep], gap_ends[keep]))
+
+
+def _open(filename: str) -> TextIO:
+    """Open input file as text, decompressing it if it is gzip'd"""
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rt')
+    return open(filename, 'r')
+
+
+def _parse_almanac(filename: str) -> tuple[str, list[Transformer]]:
+    """Read input file one line at a time, returning the seeds text and the transformers
+
+    Each transformer is built as soon as its map ends, so only one map's rules are held as text at a time.
+    """
+    seeds_txt = []
+    transformers = []
+    rules = None
+
+    with _open(filename) as fp:
+        for line in fp:
+
+            if line.rstrip().endswith('map:'):
+                # start of a new map, complete the previous one (if any)
+                if rules is not None:
+                    transformers.append(Transformer(tuple(rules)))
+                rules = []
+
+            elif rules is None:
+                # seeds, which may continue over several lines before the first map
+                seeds_txt.append(line.split(':')[-1])
+
+            elif line.strip():
+                rules.append(_parse_rule(line))
+
+        if rules is not None:
+            transformers.append(Transformer(tuple(rules)))
+
+    return ' '.join(seeds_txt), transformers
+
+
+def _parse_seeds(txt: str) -> np.ndarray:
+    """Parse seeds text as an array of scalar seeds"""
+    return np.array(txt.split(), dtype=np.int64)
     
 
-def _parse_seed_ranges(txt: str) -> list[Range]:
-    """Parse seeds text chunk as a list of seed ranges"""
+def _parse_seed_ranges(txt: str) -> RangeSet:
+    """Parse seeds text as a set of seed ranges, from (start, length) pairs"""
 
-    values = [int(x) for x in txt.strip().split()]
-    ranges = []
+    values = _parse_seeds(txt)
+    if len(values) % 2:
+        raise ValueError(f'Seed ranges must be (start, length) pairs, got {len(values)} values')
 
-    while values:
-        start = values.pop(0)
-        end = start + values.pop(0) - 1
-        ranges.append(Range(start, end))
+    starts = values[0::2]
+    return RangeSet.from_arrays(starts, starts + values[1::2] - 1)
 
-    return ranges
 
+def _parse_rule(txt: str) -> tuple[Range, int]:
+    """Parse transformer rule line"""
+    dest_start, src_start, length = (int(x) for x in txt.split())
+    return Range(src_start, src_start + length - 1), dest_start - src_start
 
-def _parse_transformer(txt: str) -> Transformer:
-    """Parse transformer text chunks"""
 
-    rules = []
+@cache
+def compose_all(transformers: tuple[Transformer, ...]) -> Transformer:
+    """Collapse a chain of transformers, applied in order, into a single transformer
 
-    for line in txt.splitlines():
-        dest_start, src_start, length = (int(x) for x in line.strip().split())
-        rule_range = Range(src_start, src_start + length -1)
-        rule_offset = dest_start - src_start
-        rules.append((rule_range, rule_offset))
+    Results are cached, so repeated queries against the same chain reuse the composed transformer.
+    """
+    return reduce(Transformer.compose, transformers)
 
-    return Transformer(tuple(rules))
 
+def lowest_location(seeds: RangeSet, transformer: Transformer) -> Optional[int]:
+    """Return the lowest value the transformer maps any seed to, or None if there are no seeds
 
+    Searches backwards from the outputs: segments are visited from lowest output value up, and the seeds are checked
+    for any that map into each one. Output ranges may overlap, so the search stops only once the next segment cannot
+    produce anything lower than the best found so far.
+    """
+    best = None
+
+    for output, offset in transformer.inverse_segments():
+        if best is not None and output.start >= best:
+            break
+        if (seed := seeds.first_in(Range(output.start - offset, output.end - offset))) is not None:
+            best = seed + offset if best is None else min(best, seed + offset)
+
+    return best
 
 
 def part_i(filename: str):
 
     print('Part 1 -----')
 
-    chunks = _parse_chunks(filename)
-    seeds = _parse_seeds(chunks[0])
-    transformers = [_parse_transformer(x) for x in chunks[1:]]
+    seeds_txt, transformers = _parse_almanac(filename)
+    seeds = _parse_seeds(seeds_txt)
 
-    locations = []
-    for value in seeds:
-        for transformer in transformers:
-            value = transformer.scalar(value)
-        locations.append(value)
+    locations = compose_all(tuple(transformers)).transform_many(seeds).tolist()
 
     print(f'{min(locations)=}')
     
 
-def part_ii(filename: str):
+def part_ii(filename: str, strategy: str = 'forward'):
 
     print('Part 2 -----')
 
-    chunks = _parse_chunks(filename)
-    seed_ranges = _parse_seed_ranges(chunks[0])
-    transformers = [_parse_transformer(x) for x in chunks[1:]]
-
-    ranges = seed_ranges
+    seeds_txt, transformers = _parse_almanac(filename)
+    seed_ranges = _parse_seed_ranges(seeds_txt)
 
-    for transformer in transformers:
+    transformer = compose_all(tuple(transformers))
 
-        next_ranges = []
-        for this in ranges:
-            next_ranges.extend(transformer.range(this))
-             
-        ranges = next_ranges
-
-    minimum_location = min(x.start for x in ranges)
+    if strategy == 'forward':
+        minimum_location = transformer.transform(seed_ranges).min()
+    elif strategy == 'inverse':
+        minimum_location = lowest_location(seed_ranges, transformer)
+    else:
+        raise ValueError(f'Unknown strategy: {strategy}')
     print(f'{minimum_location=}')
             
 
 if __name__ == '__main__':
 
-    input_path, part_number = sys.argv[1:]
+    input_path, part_number, *options = sys.argv[1:]
 
     if part_number == '1':
         part_i(input_path)
     else:
-        part_ii(input_path)
+        part_ii(input_path, *options)
         
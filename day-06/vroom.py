@@ -1,18 +1,12 @@
 import sys
 import attrs
-from math import sqrt, ceil, floor, prod
+import numpy as np
+from math import isqrt, prod
+from typing import Iterable, Optional
 
 
-def next_larger_int(num: float) -> int:
-    if (larger := ceil(num)) > num:
-        return larger
-    return int(num + 1)
-
-
-def next_smaller_int(num: float) -> int:
-    if (smaller := floor(num)) < num:
-        return smaller
-    return int(num - 1)
+# largest race time for which t * t fits in an int64, for vectorized calculations
+MAX_VECTOR_TIME = isqrt(np.iinfo(np.int64).max)
 
 
 @attrs.frozen
@@ -26,13 +20,77 @@ class Race:
 
     def ways_to_win(self) -> int:
         """Return number of ways to win this race"""
-        # solves quadratic equation for the charge time needed to match the distance-to-beat
-        #   then finds the min/max winning charge times asthe next higher/lower integers 
-        left_term = self.t / 2
-        right_term = sqrt(self.t*self.t - 4*self.d) / 2
-        min_charge_time = next_larger_int(left_term - right_term)
-        max_charge_time = next_smaller_int(left_term + right_term)
-        return max_charge_time - min_charge_time + 1
+        # charging for x gives distance x * (t - x), which is symmetric about t / 2. Estimate the min winning charge
+        #   time from the quadratic formula with an exact integer square root, then correct it to the first integer that
+        #   beats the distance. All charge times up to its mirror image t - x also win.
+        discriminant = self.t*self.t - 4*self.d
+        if discriminant <= 0:
+            return 0
+
+        min_charge_time = max((self.t - isqrt(discriminant)) // 2, 0)
+        while 2*min_charge_time <= self.t and min_charge_time * (self.t - min_charge_time) <= self.d:
+            min_charge_time += 1
+
+        return max(self.t - 2*min_charge_time + 1, 0)
+
+
+def ways_to_win_many(t: np.ndarray, d: np.ndarray) -> np.ndarray:
+    """Return number of ways to win each of many races, given arrays of race times and distances-to-beat
+
+    Same as Race.ways_to_win, but with a floating point square root corrected with exact int64 arithmetic. Race
+    times must be at most MAX_VECTOR_TIME and distances at most a quarter of the largest int64.
+    """
+    t, d = np.broadcast_arrays(np.asarray(t, dtype=np.int64), np.asarray(d, dtype=np.int64))
+    if t.size and (t.max() > MAX_VECTOR_TIME or d.max() > np.iinfo(np.int64).max // 4):
+        raise ValueError('Race times or distances are too large for int64 arithmetic, use Race.ways_to_win')
+
+    discriminant = t*t - 4*d
+    valid = discriminant > 0
+    min_charge_time = np.maximum((t - np.sqrt(np.maximum(discriminant, 0)).astype(np.int64)) // 2, 0)
+
+    # the float square root may be off either way, so step down while the previous charge time also wins...
+    while (down := valid & (min_charge_time > 0) & ((min_charge_time - 1) * (t - min_charge_time + 1) > d)).any():
+        min_charge_time[down] -= 1
+
+    # ...and up while this charge time does not
+    while (up := valid & (2*min_charge_time <= t) & (min_charge_time * (t - min_charge_time) <= d)).any():
+        min_charge_time[up] += 1
+
+    return np.where(valid, np.maximum(t - 2*min_charge_time + 1, 0), 0)
+
+
+def sweep(
+    times: Iterable[int],
+    distances: Iterable[int],
+    out: Optional[str] = None,
+    block_size: int = 2**22,
+) -> np.ndarray:
+    """Return number of ways to win for every combination of race time and distance-to-beat, with shape
+    (len(times), len(distances))
+
+    Rows are computed a block of about block_size cells at a time. If 'out' is given, each block is written to a .npy
+    file at that path as it is computed and a memory map of the file is returned, for grids too big for memory.
+    """
+    times, distances = (
+        np.asarray(x, dtype=np.int64) if isinstance(x, np.ndarray) else np.fromiter(x, dtype=np.int64)
+        for x in (times, distances)
+    )
+    shape = (len(times), len(distances))
+
+    if out is None:
+        result = np.empty(shape, dtype=np.int64)
+    else:
+        result = np.lib.format.open_memmap(out, mode='w+', dtype=np.int64, shape=shape)
+
+    block_rows = max(block_size // max(len(distances), 1), 1)
+    for start in range(0, len(times), block_rows):
+        stop = start + block_rows
+        result[start:stop] = ways_to_win_many(times[start:stop, None], distances[None, :])
+
+    if out is not None:
+        result.flush()
+
+    return result
 
 
 def part_i(filename: str):
@@ -45,9 +103,14 @@ def part_i(filename: str):
         _, distances_txt = fp.readline().split(':')
         distances = [int(x) for x in distances_txt.strip().split(' ') if x]
     
-    races = tuple(Race(t, d) for t, d in zip(times, distances))
-
-    ways_to_win = [r.ways_to_win() for r in races]
+    # vectorize when the races fit in int64 arithmetic, otherwise solve each race exactly with Python integers
+    if (
+        max(map(abs, times), default=0) <= MAX_VECTOR_TIME
+        and max(map(abs, distances), default=0) <= np.iinfo(np.int64).max // 4
+    ):
+        ways_to_win = ways_to_win_many(times, distances).tolist()
+    else:
+        ways_to_win = [Race(t, d).ways_to_win() for t, d in zip(times, distances)]
 
     print(f'Ways to win: {prod(ways_to_win)}')
 
@@ -1,10 +1,29 @@
 import sys
 from enum import Enum
 import attrs
-from collections import Counter
+import numpy as np
 from operator import attrgetter, methodcaller
 
 
+# card values, better cards have higher values. All fit in 4 bits.
+CARD_VALUES = {'A': 14, 'K': 13, 'Q': 12, 'J': 11, 'T': 10, **{str(x): x for x in range(2, 10)}}
+
+# same, treating "J" cards as jokers, which are the worst cards
+JOKER_CARD_VALUES = {**CARD_VALUES, 'J': 1}
+
+# hand types, indexed by the count of the most common card (counting jokers) and the number of distinct cards (not
+#   counting jokers). Better hands have higher hand types, impossible combinations are 0.
+HAND_TYPES = np.zeros((6, 6), dtype=np.uint8)
+HAND_TYPES[5, 0] = 7  # 5 of a kind, all jokers
+HAND_TYPES[5, 1] = 7  # 5 of a kind
+HAND_TYPES[4, 2] = 6  # 4 of a kind
+HAND_TYPES[3, 2] = 5  # full house
+HAND_TYPES[3, 3] = 4  # 3 of a kind
+HAND_TYPES[2, 3] = 3  # 2 pair
+HAND_TYPES[2, 4] = 2  # one pair
+HAND_TYPES[1, 5] = 1  # high card
+
+
 @attrs.frozen
 class Hand:
     """A five-card hand for the Camel Cards game"""
@@ -19,52 +38,35 @@ class Hand:
         """Card values as (sortable) integers. Better cards have higher values.
         Optionally, treat "J" cards as jokers
         """
-        specials = {'A': 14, 'K': 13, 'Q': 12, 'J': 1 if jokers else 11, 'T': 10}
-        values = []
-        for card in self.cards:
-            try:
-                values.append(specials[card])
-            except KeyError:
-                values.append(int(card))
-        return tuple(values)
+        card_values = JOKER_CARD_VALUES if jokers else CARD_VALUES
+        return tuple(card_values[card] for card in self.cards)
 
     def hand_type(self, jokers: bool = False) -> int:
         """Hand type as a (sortable) integer. Better hands have higher hand types.
         Optionally, treat "J" cards as jokers
         """
 
-        # count cards, treating J as a wildcard if requested
-        counter = Counter(self.cards)
-
-        if jokers:
-            num_jokers = counter.pop('J', 0)
-            if num_jokers == 5:
-                # all jokers, that is 5-of-a-kind
-                counts = [num_jokers]
-            else:
-                # hand is improved most by adding more of the most common card
-                counts = sorted(counter.values(), reverse=True)
-                counts[0] += num_jokers
-
-        else:
-            counts = sorted(counter.values(), reverse=True)
-
-        # classify hand based on card count
-        if counts == [5,]:
-            return 7  # 5 of a kind
-        if counts == [4, 1]:
-            return 6  # 4 of a kind
-        if counts == [3, 2]:
-            return 5  # full house
-        if counts == [3, 1, 1]:
-            return 4  # 3 of a kind
-        if counts == [2, 2, 1]:
-            return 3  # 2 pair
-        if counts == [2, 1, 1, 1]:
-            return 2  # one pair
-        if counts == [1, 1, 1, 1, 1]:
-            return 1  # high card
-        raise ValueError(f'Unknown hand type: {self.cards}')
+        # set aside J cards as wildcards if requested
+        cards = self.cards.replace('J', '') if jokers else self.cards
+        num_jokers = len(self.cards) - len(cards)
+
+        # hand is improved most by adding jokers to the most common card
+        hand_type = 0
+        if len(self.cards) == 5:
+            hand_type = HAND_TYPES[max(map(cards.count, cards), default=0) + num_jokers, len(set(cards))]
+        if not hand_type:
+            raise ValueError(f'Unknown hand type: {self.cards}')
+        return int(hand_type)
+
+    def key(self, jokers: bool = False) -> int:
+        """Sort key packed into a single integer, ordering hands worst-to-best by hand type (primary), then by card
+        values (secondary). The hand type is in the high bits, above five 4-bit card values.
+        Optionally, treat "J" cards as jokers
+        """
+        key = self.hand_type(jokers)
+        for value in self.card_values(jokers):
+            key = key << 4 | value
+        return key
 
 
 def parse_hands(filename: str) -> list[Hand]:
@@ -82,13 +84,59 @@ def parse_hands(filename: str) -> list[Hand]:
 
 
 def sort_hands(values: list[Hand], jokers: bool = False) -> list[Hand]:
-    """Sort hands from worst-to-best by hand type (primary), then by card values (secondary)
-    See: https://docs.python.org/3/howto/sorting.html#sort-stability-and-complex-sorts
+    """Sort hands from worst-to-best by hand type (primary), then by card values (secondary)"""
+    return sorted(values, key=methodcaller('key', jokers))
+
+
+def card_value_array(values: list[Hand], jokers: bool = False) -> np.ndarray:
+    """Card values (see Hand.card_values) of each hand as a (num_hands, 5) array
+    Optionally, treat "J" cards as jokers
+    """
+    lookup = np.zeros(256, dtype=np.uint8)
+    for card, value in (JOKER_CARD_VALUES if jokers else CARD_VALUES).items():
+        lookup[ord(card)] = value
+
+    codes = np.frombuffer(''.join(x.cards for x in values).encode(), dtype=np.uint8)
+    if len(codes) != 5 * len(values):
+        raise ValueError('All hands must have five cards')
+    card_values = lookup[codes].reshape(-1, 5)
+    if not card_values.all():
+        raise ValueError('Unknown card(s) in hands')
+
+    return card_values
+
+
+def classify(card_values: np.ndarray) -> np.ndarray:
+    """Hand type (see Hand.hand_type) of each row of a (num_hands, 5) array of card values, cards valued 1 are jokers
+
+    Sorting each hand puts equal cards in runs (and jokers first), so the most common card is the longest run and the
+    distinct cards are the starts of runs. Runs are measured one column at a time, keeping all arrays (num_hands,).
     """
-    return sorted(
-        sorted(values, key=methodcaller('card_values', jokers)),
-        key=methodcaller('hand_type', jokers)
-    )
+    cards = np.sort(card_values, axis=1)
+    is_joker = cards == JOKER_CARD_VALUES['J']
+    num_jokers = is_joker.sum(axis=1, dtype=np.uint8)
+
+    run = np.zeros(len(cards), dtype=np.uint8)
+    longest = np.zeros(len(cards), dtype=np.uint8)
+    distinct = np.zeros(len(cards), dtype=np.uint8)
+    for ii in range(5):
+        new_run = cards[:, ii] != cards[:, ii - 1] if ii else np.ones(len(cards), dtype=bool)
+        run += 1
+        run[new_run] = 1
+        run[is_joker[:, ii]] = 0
+        np.maximum(longest, run, out=longest)
+        distinct += new_run & ~is_joker[:, ii]
+
+    return HAND_TYPES[longest + num_jokers, distinct]
+
+
+def encode_hands(values: list[Hand], jokers: bool = False) -> np.ndarray:
+    """Return the packed sort key of each hand (see Hand.key) as an array"""
+    card_values = card_value_array(values, jokers)
+    keys = classify(card_values).astype(np.uint32)
+    for ii in range(5):
+        keys = keys << 4 | card_values[:, ii]
+    return keys
 
 
 def get_winnings(filename: str, jokers: bool):
@@ -97,11 +145,12 @@ def get_winnings(filename: str, jokers: bool):
     """
 
     hands = parse_hands(filename)
-    sorted_hands = sort_hands(hands, jokers) 
+    bids = np.array([x.bid for x in hands], dtype=np.int64)
+
+    # rank hands with a single sort of their keys
+    order = np.argsort(encode_hands(hands, jokers), kind='stable')
     
-    winnings = 0
-    for rank, hand in enumerate(sorted_hands, start=1):
-        winnings += rank * hand.bid
+    winnings = int((np.arange(1, len(hands) + 1) * bids[order]).sum())
 
     print(f'{winnings=}')
         
@@ -2,6 +2,10 @@ import sys
 from attrs import define, frozen
 from operator import attrgetter
 from copy import copy
+from math import gcd
+from typing import Optional
+
+import numpy as np
 
 
 def parse_input(filename: str) -> tuple[str, dict[str, tuple[str, str]]]:
@@ -22,62 +26,195 @@ def parse_input(filename: str) -> tuple[str, dict[str, tuple[str, str]]]:
     return instructions, graph
 
 
+@frozen(eq=False)
+class CompiledGraph:
+    """Graph with node names interned to dense integer indices
+
+    Children are stored as int32 arrays indexed by node, so that a step is an array lookup rather than a string hash,
+    and the Z nodes are precomputed as a boolean mask.
+    """
+    names: tuple[str, ...]
+    index: dict[str, int]
+    left: np.ndarray
+    right: np.ndarray
+    terminal: np.ndarray
+
+    @property
+    def children(self) -> np.ndarray:
+        """(2, num_nodes) array of child indices, indexed by move (0 for L, 1 for R) then node"""
+        return np.stack((self.left, self.right))
+
+
+def compile_graph(graph: dict[str, tuple[str, str]]) -> CompiledGraph:
+    """Intern node names and pack the graph into arrays"""
+    names = tuple(graph.keys())
+    index = {name: ii for ii, name in enumerate(names)}
+    return CompiledGraph(
+        names=names,
+        index=index,
+        left=np.fromiter((index[x] for x, _ in graph.values()), dtype=np.int32, count=len(names)),
+        right=np.fromiter((index[x] for _, x in graph.values()), dtype=np.int32, count=len(names)),
+        terminal=np.fromiter((x[-1] == 'Z' for x in names), dtype=bool, count=len(names)),
+    )
+
+
+def compile_instructions(instructions: str) -> np.ndarray:
+    """Convert instructions string to an array of moves, 0 for L and 1 for R"""
+    if unknown := set(instructions) - set('LR'):
+        raise ValueError(f'Unknown instruction(s): {unknown}')
+    return (np.frombuffer(instructions.encode(), dtype=np.uint8) == ord('R')).astype(np.int8)
+
+
+@frozen(eq=False)
+class JumpTable:
+    """Binary lifting tables for answering step-count queries without walking every step
+
+    Tables are indexed by node only, so queries are for travelers starting at the first instruction, and cost
+    O(log N + len(instructions)) for N steps, as the partial cycle left after the whole cycles is walked one step at a
+    time. Level k covers 2**k full cycles of the instructions:
+    + jumps[k][node] is the node reached after 2**k cycles
+    + hits[k][node] is the first step (counting from 1) within those cycles at which the traveler is at a terminal
+      node, or -1 if there is none
+    """
+    graph: CompiledGraph
+    moves: np.ndarray
+    terminal: np.ndarray
+    jumps: tuple[np.ndarray, ...]
+    hits: tuple[np.ndarray, ...]
+
+    @classmethod
+    def build(cls, moves: np.ndarray, graph: CompiledGraph, max_steps: int, terminal: Optional[np.ndarray] = None):
+        """Build tables able to answer queries of up to max_steps steps. Terminal nodes default to the Z nodes."""
+        terminal = graph.terminal if terminal is None else terminal
+        children = graph.children
+
+        # walk every node through one full cycle of instructions at once
+        node = np.arange(len(graph.names), dtype=np.int32)
+        hit = np.full(len(graph.names), -1, dtype=np.int64)
+        for step, move in enumerate(moves, start=1):
+            node = children[move, node]
+            hit[(hit < 0) & terminal[node]] = step
+
+        jumps = [node]
+        hits = [hit]
+        for level in range(1, max(1, (max_steps // len(moves)).bit_length())):
+            jump, hit = jumps[-1], hits[-1]
+            later = hit[jump]
+            later_steps = np.where(later >= 0, later + (1 << (level - 1)) * len(moves), -1)
+            jumps.append(jump[jump])
+            hits.append(np.where(hit >= 0, hit, later_steps))
+
+        return cls(graph=graph, moves=moves, terminal=terminal, jumps=tuple(jumps), hits=tuple(hits))
+
+    @property
+    def max_steps(self) -> int:
+        """Longest query the tables can answer"""
+        return (1 << len(self.jumps)) * len(self.moves) - 1
+
+    def _check(self, steps: int):
+        if not 0 <= steps <= self.max_steps:
+            raise ValueError(f'Steps must be between 0 and {self.max_steps}, got {steps}')
+
+    def position(self, node: int, steps: int) -> int:
+        """Return the node a traveler starting at node is at after 'steps' steps
+
+        Full instruction cycles cost O(log steps), the remaining partial cycle is walked one step at a time.
+        """
+        self._check(steps)
+        cycles, remainder = divmod(steps, len(self.moves))
+
+        for level, jump in enumerate(self.jumps):
+            if cycles >> level & 1:
+                node = jump[node]
+
+        children = (self.graph.left, self.graph.right)
+        for move in self.moves[:remainder]:
+            node = children[move][node]
+
+        return int(node)
+
+    def first_hit(self, node: int, max_steps: int) -> Optional[int]:
+        """Return the first step (counting from 1) at which a traveler starting at node is at a terminal node, or None
+        if that does not happen within max_steps steps
+        """
+        self._check(max_steps)
+        cycles = max_steps // len(self.moves)
+        offset = 0
+
+        # skip the largest run of whole cycles that does not contain a hit
+        for level in reversed(range(len(self.jumps))):
+            if (1 << level) <= cycles and self.hits[level][node] < 0:
+                node = self.jumps[level][node]
+                offset += (1 << level) * len(self.moves)
+                cycles -= 1 << level
+
+        # the next cycle contains a hit...
+        if cycles:
+            return offset + int(self.hits[0][node])
+
+        # ...or there is less than one cycle left to search
+        children = (self.graph.left, self.graph.right)
+        for step, move in enumerate(self.moves[:max_steps - offset], start=1):
+            node = children[move][node]
+            if self.terminal[node]:
+                return offset + step
+
+        return None
+
+
 def part_i(filename: str):
 
 
     instructions, graph = parse_input(filename)
+    moves = compile_instructions(instructions)
+    compiled = compile_graph(graph)
+
+    # memoryviews give fast scalar indexing without copying the arrays to lists
+    children = (memoryview(compiled.left), memoryview(compiled.right))
+    moves = memoryview(moves)
 
-    at = 'AAA'
+    at = compiled.index['AAA']
+    end = compiled.index['ZZZ']
     steps = 0
 
-    while at != 'ZZZ':
-        instruction = instructions[steps % len(instructions)]
-        if instruction == 'L':
-            at = graph[at][0]
-        elif instruction == 'R':
-            at = graph[at][1]
-        else:
-            raise ValueError('Unknown instruction: {instruction}')
+    while at != end:
+        at = children[moves[steps % len(moves)]][at]
         steps += 1
     
-    print(f'At {at} in {steps} steps')
+    print(f'At {compiled.names[at]} in {steps} steps')
 
 
 @define
 class Traveler:
-    node: str
+    node: int
     steps: int
-    
-    @property
-    def done(self) -> int:
-        return self.node[-1] == 'Z'
 
 
 @frozen
 class Location:
-    node: str
+    node: int
     instruction_index: int
 
 
 @frozen
 class Destination:
-    node: str
+    node: int
     num_steps: int
 
 
+def walk_travelers(moves: np.ndarray, graph: CompiledGraph) -> int:
+    """Return the number of steps until all travelers are at a Z node, found by walking them one at a time
 
-def part_ii(filename: str):
-    # NOTE: run time is too long! It turns out that the travelers are traversing simple loops of len(instructions) steps
-    #   To get the answer, we need the least common multiple of all these loop lengths, which is 21_003_205_388_413. My 
-    #   program takes a looooong time to get to 21 trillion.
-    #   
-    # I found this out by inspecting the "cheat_sheet" variable. Not sure how I would solve this entirely programatically though!
-
-    instructions, graph = parse_input(input_filename)
+    NOTE: run time is too long for the real input! The answer is 21_003_205_388_413 steps, use cycle detection
+    (see solve_cycles) instead.
+    """
+    children = (memoryview(graph.left), memoryview(graph.right))
+    terminal = memoryview(graph.terminal)
+    moves = memoryview(moves)
 
     cheat_sheet: dict[Location, Destination] = {}
 
-    travelers = [Traveler(name, 0)  for name in graph.keys() if name.endswith('A')]
+    travelers = [Traveler(ii, 0)  for ii, name in enumerate(graph.names) if name.endswith('A')]
     min_traveler = travelers[0]  # arbitrary
     max_traveler = travelers[-1]  # arbitrary
 
@@ -87,7 +224,7 @@ def part_ii(filename: str):
         all_done = True
         for traveler in travelers:
 
-            all_done = all_done and traveler.done
+            all_done = all_done and terminal[traveler.node]
 
             if traveler.steps < min_traveler.steps:
                 min_traveler = traveler
@@ -100,8 +237,7 @@ def part_ii(filename: str):
             print(f'{min_traveler.steps:_}')
 
         # not done! update the traveler with the fewest steps
-        instruction_index = min_traveler.steps % len(instructions)
-        instruction = instructions[instruction_index]
+        instruction_index = min_traveler.steps % len(moves)
 
         current_location = Location(min_traveler.node, instruction_index)
 
@@ -117,37 +253,156 @@ def part_ii(filename: str):
             while True:
             
                 # move to child as instructed
+                min_traveler.node = children[moves[min_traveler.steps % len(moves)]][min_traveler.node]
                 min_traveler.steps += 1
-                
-                left, right = graph[min_traveler.node]
-                if instruction == 'L':
-                    min_traveler.node = left
-                elif instruction == 'R':
-                    min_traveler.node = right
-                else:
-                    raise ValueError(f'Unknown instruction: {instruction}')
-
-                # prepare next instruction 
-                instruction_index = min_traveler.steps % len(instructions)
-                instruction = instructions[instruction_index]
 
                 # stop if this is a possible endpoint
-                if min_traveler.done:
+                if terminal[min_traveler.node]:
                     cheat_sheet[current_location] = Destination(min_traveler.node, min_traveler.steps - init_steps)
                     break
 
-    print(f'Complete in {min_traveler.steps} steps')
+    return min_traveler.steps
+
+
+def walk_lockstep(moves: np.ndarray, graph: CompiledGraph, starts: np.ndarray, max_steps: Optional[int] = None) -> Optional[int]:
+    """Return the number of steps until all travelers are at a Z node, found by advancing them all together
+
+    Traveler positions are kept in a single array and advanced with one indexing operation per instruction. Gives up
+    and returns None after max_steps steps, if provided.
+    """
+    children = graph.children
+    at = np.asarray(starts, dtype=np.int32)
+    steps = 0
+
+    while not graph.terminal[at].all():
+        if steps == max_steps:
+            return None
+        at = children[moves[steps % len(moves)], at]
+        steps += 1
+
+    return steps
+
+
+@frozen
+class Cycle:
+    """Path of a single traveler, which must eventually loop over the (node, instruction_index) state space
+
+    The traveler enters the loop after 'start' steps and repeats it every 'length' steps thereafter. 'hits' are all steps
+    before start + length at which the traveler is at a Z node; later hits repeat the in-loop ones.
+    """
+    start: int
+    length: int
+    hits: tuple[int, ...]
+
+    def is_hit(self, steps: int) -> bool:
+        """True if the traveler is at a Z node after 'steps' steps"""
+        if steps >= self.start + self.length:
+            steps = self.start + (steps - self.start) % self.length
+        return steps in self.hits
+
+    @property
+    def residues(self) -> tuple[int, ...]:
+        """In-loop hits, modulo the loop length"""
+        return tuple(x % self.length for x in self.hits if x >= self.start)
+
+
+def find_cycle(moves: np.ndarray, graph: CompiledGraph, node: int) -> Cycle:
+    """Walk a traveler from node until it revisits a (node, instruction_index) state"""
+    children = (memoryview(graph.left), memoryview(graph.right))
+    terminal = memoryview(graph.terminal)
+    moves = memoryview(moves)
+
+    seen: dict[tuple[int, int], int] = {}
+    hits = []
+    steps = 0
+
+    while (state := (node, steps % len(moves))) not in seen:
+        seen[state] = steps
+        if terminal[node]:
+            hits.append(steps)
+        node = children[moves[state[1]]][node]
+        steps += 1
+
+    start = seen[state]
+    return Cycle(start=start, length=steps - start, hits=tuple(hits))
+
+
+def combine_residues(a1: int, m1: int, a2: int, m2: int) -> Optional[tuple[int, int]]:
+    """Generalized chinese remainder theorem: solve x = a1 (mod m1) and x = a2 (mod m2)
+
+    Returns (a, m) such that the solutions are x = a (mod m), or None if there are no solutions. Moduli need not be
+    coprime.
+    """
+    g = gcd(m1, m2)
+    if (a2 - a1) % g:
+        return None
+    m = m1 // g * m2
+    k = (a2 - a1) // g * pow(m1 // g, -1, m2 // g) % (m2 // g)
+    return (a1 + m1 * k) % m, m
+
+
+def solve_cycles(cycles: list[Cycle]) -> Optional[int]:
+    """Return the fewest steps at which every traveler is at a Z node, or None if that never happens"""
+
+    # before every traveler is in its loop, the answer must be one of the (finitely many) early hits of the traveler
+    #   that takes longest to get there
+    latest = max(cycles, key=attrgetter('start'))
+    for steps in latest.hits:
+        if steps < latest.start and all(x.is_hit(steps) for x in cycles):
+            return steps
+
+    # after that, each traveler allows a set of residues modulo its loop length, combine them all
+    solutions = {(0, 1)}
+    for cycle in cycles:
+        solutions = {
+            combined
+            for a1, m1 in solutions
+            for a2 in cycle.residues
+            if (combined := combine_residues(a1, m1, a2, cycle.length))
+        }
+        if not solutions:
+            return None
+
+    # pick the smallest solution at or after the last traveler enters its loop
+    return min(a + (max(latest.start - a, 0) + m - 1) // m * m for a, m in solutions)
+
+
+def part_ii(filename: str, strategy: str = 'cycle', check: bool = False):
+
+    instructions, graph = parse_input(filename)
+    moves = compile_instructions(instructions)
+    compiled = compile_graph(graph)
+
+    starts = [ii for ii, name in enumerate(compiled.names) if name.endswith('A')]
+
+    if strategy == 'cycle':
+        steps = solve_cycles([find_cycle(moves, compiled, x) for x in starts])
+    elif strategy == 'batch':
+        steps = walk_lockstep(moves, compiled, np.array(starts))
+    elif strategy == 'step':
+        steps = walk_travelers(moves, compiled)
+    else:
+        raise ValueError(f'Unknown strategy: {strategy}')
+
+    # optionally, confirm that every traveler is at a Z node after that many steps, without walking them there
+    if check and steps is not None:
+        table = JumpTable.build(moves, compiled, steps)
+        missed = [compiled.names[x] for x in starts if not compiled.terminal[table.position(x, steps)]]
+        if missed:
+            raise RuntimeError(f'Travelers from {missed} are not at a Z node after {steps} steps')
+
+    print(f'Complete in {steps} steps')
 
 
 if __name__ == '__main__':
 
-    input_filename, part_number = sys.argv[1:]
+    input_filename, part_number, *options = sys.argv[1:]
 
     if part_number == '1':
         part_i(input_filename)
 
     elif part_number == '2':
-        part_ii(input_filename)
+        part_ii(input_filename, *options[:1], check='check' in options[1:])
 
     else:
         raise ValueError(f'Invalid part number: {part_number}')